@@ -2,19 +2,35 @@
 Conversation API routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+
+import tiktoken
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 from app.core.database import get_db
 from app.models.conversation import Conversation
-from app.models.message import Message
 from app.services.memory_manager import MemoryManager
-from app.services.llm_adapters import LLMRouter, LLMMessage, MessageRole
+from app.services.llm_adapters import LLMRouter, LLMMessage, LLMResponse, MessageRole
 
 router = APIRouter()
 
+# BPE encoder cached at module scope; encoding is done in Rust and gives
+# real token counts instead of the rough len(content.split()) proxy
+_ENC = tiktoken.encoding_for_model("gpt-4")
+
+
+def _count_tokens(text: str) -> int:
+    """Count tokens in a piece of text"""
+    return len(_ENC.encode(text, disallowed_special=()))
+
 
 class MessageRequest(BaseModel):
     """Request model for sending a message"""
@@ -26,118 +42,99 @@ class MessageRequest(BaseModel):
 
 class MessageResponse(BaseModel):
     """Response model for message"""
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     role: str
     content: str
-    model_used: str
+    model_used: Optional[str] = None
     token_count: int
-    cost: str
-    carbon_footprint: str
-    created_at: str
+    cost: float
+    carbon_footprint: float
+    created_at: datetime
 
 
 class ConversationResponse(BaseModel):
     """Response model for conversation"""
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     title: Optional[str]
     current_model: str
     message_count: int
     total_tokens: int
-    estimated_cost: str
-    estimated_carbon: str
-    created_at: str
-    messages: List[MessageResponse]
+    estimated_cost: float
+    estimated_carbon: float
+    created_at: datetime
+    messages: List[MessageResponse] = []
 
 
 @router.post("/", response_model=ConversationResponse)
 async def create_conversation(
     title: Optional[str] = None,
     initial_model: str = "gpt-4",
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new conversation"""
-    
+
     conversation = Conversation(
         title=title,
         current_model=initial_model
     )
-    
+
     db.add(conversation)
-    db.commit()
-    db.refresh(conversation)
-    
-    return ConversationResponse(
-        id=conversation.id,
-        title=conversation.title,
-        current_model=conversation.current_model,
-        message_count=0,
-        total_tokens=conversation.total_tokens,
-        estimated_cost=conversation.estimated_cost,
-        estimated_carbon=conversation.estimated_carbon,
-        created_at=conversation.created_at.isoformat(),
-        messages=[]
-    )
+    await db.commit()
+    await db.refresh(conversation)
+
+    # A brand-new conversation has no messages; mark the collection loaded
+    # (and empty) without history tracking. Plain assignment would itself
+    # lazy-load the old collection for the delete-orphan cascade, which
+    # can't do sync IO on an AsyncSession
+    set_committed_value(conversation, "messages", [])
+
+    return conversation
 
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a conversation by ID"""
-    
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+
+    # selectinload fetches the ordered messages in the same round-trip cycle
+    # as the conversation instead of a separate lazy query
+    conversation = await db.scalar(
+        select(Conversation)
+        .options(selectinload(Conversation.messages))
+        .where(Conversation.id == conversation_id)
+    )
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
-    
-    # Get messages
-    messages = (
-        db.query(Message)
-        .filter(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at.asc())
-        .all()
-    )
-    
-    message_responses = [
-        MessageResponse(
-            id=msg.id,
-            role=msg.role,
-            content=msg.content,
-            model_used=msg.model_used or "",
-            token_count=msg.token_count,
-            cost=msg.cost,
-            carbon_footprint=msg.carbon_footprint,
-            created_at=msg.created_at.isoformat()
-        )
-        for msg in messages
-    ]
-    
-    return ConversationResponse(
-        id=conversation.id,
-        title=conversation.title,
-        current_model=conversation.current_model,
-        message_count=len(messages),
-        total_tokens=conversation.total_tokens,
-        estimated_cost=conversation.estimated_cost,
-        estimated_carbon=conversation.estimated_carbon,
-        created_at=conversation.created_at.isoformat(),
-        messages=message_responses
-    )
+
+    # Validate once with pydantic-core and serialize straight to JSON bytes
+    # in Rust; returning a Response skips FastAPI's jsonable_encoder pass,
+    # which walks every message field in Python and dominates for long
+    # conversations
+    payload = ConversationResponse.model_validate(conversation)
+    return Response(content=payload.model_dump_json(), media_type="application/json")
 
 
 @router.post("/{conversation_id}/messages", response_model=MessageResponse)
 async def send_message(
     conversation_id: int,
     message_request: MessageRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Send a message to a conversation"""
-    
+
     # Get conversation
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    conversation = await db.scalar(
+        select(Conversation).where(Conversation.id == conversation_id)
+    )
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -147,111 +144,132 @@ async def send_message(
     # Initialize services
     memory_manager = MemoryManager(db)
     llm_router = LLMRouter()
-    
+
     # TODO: Register adapters with actual API keys
     # For now, we'll create a mock response
-    
+
+    # Encode the user message in a worker thread so the (CPU-bound) embed
+    # overlaps the context fetch below - and the LLM call, once real
+    # streaming adapters are wired in - instead of blocking before them
+    embedding_task = asyncio.create_task(
+        asyncio.to_thread(memory_manager.embed_text, message_request.content)
+    )
+
+    # Get conversation context
+    context = await memory_manager.get_conversation_context(conversation_id)
+
     # Store user message
     user_message = await memory_manager.store_message(
         conversation_id=conversation_id,
         role="user",
         content=message_request.content,
         model_used="user",
-        token_count=len(message_request.content.split()),
+        token_count=_count_tokens(message_request.content),
         cost=0.0,
-        carbon_footprint=0.0
+        carbon_footprint=0.0,
+        embedding=await embedding_task
     )
     
-    # Get conversation context
-    context = await memory_manager.get_conversation_context(conversation_id)
-    
     # Generate response (mock for now)
     # TODO: Implement actual LLM call
-    assistant_content = f"Mock response to: {message_request.content}"
-    
+    llm_response = LLMResponse(
+        content=f"Mock response to: {message_request.content}",
+        model_used=message_request.model,
+        token_count=0,
+        cost=0.01,
+        carbon_footprint=0.001
+    )
+
+    # Prefer the provider-reported completion tokens (matches billing);
+    # only re-tokenize locally when the adapter didn't report usage
+    completion_tokens = (
+        llm_response.completion_tokens
+        if llm_response.completion_tokens is not None
+        else _count_tokens(llm_response.content)
+    )
+
     # Store assistant response
     assistant_message = await memory_manager.store_message(
         conversation_id=conversation_id,
         role="assistant",
-        content=assistant_content,
-        model_used=message_request.model,
-        token_count=len(assistant_content.split()),
-        cost=0.01,
-        carbon_footprint=0.001
+        content=llm_response.content,
+        model_used=llm_response.model_used,
+        token_count=completion_tokens,
+        cost=llm_response.cost,
+        carbon_footprint=llm_response.carbon_footprint
     )
     
-    # Update conversation totals
-    conversation.total_tokens += user_message.token_count + assistant_message.token_count
-    conversation.estimated_cost = str(float(conversation.estimated_cost) + 0.01)
-    conversation.estimated_carbon = str(float(conversation.estimated_carbon) + 0.001)
-    conversation.current_model = message_request.model
-    
-    db.commit()
-    
-    return MessageResponse(
-        id=assistant_message.id,
-        role=assistant_message.role,
-        content=assistant_message.content,
-        model_used=assistant_message.model_used or "",
-        token_count=assistant_message.token_count,
-        cost=assistant_message.cost,
-        carbon_footprint=assistant_message.carbon_footprint,
-        created_at=assistant_message.created_at.isoformat()
+    # Update conversation totals server-side so concurrent turns on the same
+    # conversation accumulate correctly without read-modify-write races
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(
+            total_tokens=Conversation.total_tokens
+            + user_message.token_count
+            + assistant_message.token_count,
+            estimated_cost=Conversation.estimated_cost + Decimal("0.01"),
+            estimated_carbon=Conversation.estimated_carbon + Decimal("0.001"),
+            current_model=message_request.model,
+        )
     )
 
+    # One commit for the whole turn; created_at was already returned by the
+    # flush (eager_defaults), so no refresh round-trip is needed
+    await db.commit()
+
+    return assistant_message
+
 
 @router.get("/", response_model=List[ConversationResponse])
 async def list_conversations(
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List all conversations"""
-    
-    conversations = (
-        db.query(Conversation)
-        .filter(Conversation.is_active == True)
-        .order_by(Conversation.updated_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
-    
-    result = []
-    for conv in conversations:
-        # Get message count
-        message_count = db.query(Message).filter(Message.conversation_id == conv.id).count()
-        
-        result.append(ConversationResponse(
-            id=conv.id,
-            title=conv.title,
-            current_model=conv.current_model,
-            message_count=message_count,
-            total_tokens=conv.total_tokens,
-            estimated_cost=conv.estimated_cost,
-            estimated_carbon=conv.estimated_carbon,
-            created_at=conv.created_at.isoformat(),
-            messages=[]  # Don't include messages in list view
-        ))
-    
-    return result
+
+    # Project only the columns the list view returns; plain Row tuples skip
+    # ORM hydration and never touch the messages relationship
+    rows = (
+        await db.execute(
+            select(
+                Conversation.id,
+                Conversation.title,
+                Conversation.current_model,
+                Conversation.message_count,
+                Conversation.total_tokens,
+                Conversation.estimated_cost,
+                Conversation.estimated_carbon,
+                Conversation.created_at,
+            )
+            .where(Conversation.is_active == True)
+            .order_by(Conversation.updated_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+    ).all()
+
+    return [ConversationResponse.model_validate(row) for row in rows]
 
 
 @router.delete("/{conversation_id}")
 async def delete_conversation(
     conversation_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a conversation"""
-    
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+
+    conversation = await db.scalar(
+        select(Conversation).where(Conversation.id == conversation_id)
+    )
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
-    
+
     conversation.is_active = False
-    db.commit()
-    
+    await db.commit()
+
     return {"message": "Conversation deleted successfully"}
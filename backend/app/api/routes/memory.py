@@ -2,10 +2,12 @@
 Memory API routes - for context management and search
 """
 
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 from app.core.database import get_db
 from app.services.memory_manager import MemoryManager
@@ -22,11 +24,13 @@ class SearchRequest(BaseModel):
 
 class SearchResponse(BaseModel):
     """Response model for memory search"""
+    model_config = ConfigDict(from_attributes=True)
+
     message_id: int
     content: str
     role: str
     similarity_score: float
-    created_at: str
+    created_at: datetime
     conversation_id: int
 
 
@@ -39,41 +43,36 @@ class CompressRequest(BaseModel):
 @router.post("/search", response_model=List[SearchResponse])
 async def search_memory(
     search_request: SearchRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Search for similar messages in memory"""
     
     memory_manager = MemoryManager(db)
     
-    # Search for similar messages
-    messages = await memory_manager.search_similar_messages(
+    # Search for similar messages (returns real cosine similarity scores)
+    results = await memory_manager.search_similar_messages(
         query=search_request.query,
         conversation_id=search_request.conversation_id,
         limit=search_request.limit
     )
-    
-    # Convert to response format
-    results = []
-    for i, msg in enumerate(messages):
-        # Calculate similarity score (simplified)
-        similarity_score = 1.0 - (i * 0.1)  # Mock similarity score
-        
-        results.append(SearchResponse(
+
+    return [
+        SearchResponse(
             message_id=msg.id,
             content=msg.content,
             role=msg.role,
-            similarity_score=similarity_score,
-            created_at=msg.created_at.isoformat(),
+            similarity_score=similarity,
+            created_at=msg.created_at,
             conversation_id=msg.conversation_id
-        ))
-    
-    return results
+        )
+        for msg, similarity in results
+    ]
 
 
 @router.post("/compress")
 async def compress_context(
     compress_request: CompressRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Compress conversation context to reduce token usage"""
     
@@ -99,7 +98,7 @@ async def compress_context(
 @router.get("/conversation/{conversation_id}/summary")
 async def get_conversation_summary(
     conversation_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a summary of a conversation"""
     
@@ -121,7 +120,7 @@ async def get_conversation_context(
     conversation_id: int,
     max_messages: int = 10,
     include_compressed: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get conversation context for LLM input"""
     
@@ -2,14 +2,23 @@
 Database configuration and session management
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
+from sqlalchemy.orm import declarative_base
 from app.core.config import settings
 
-# Database engine
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async engine via asyncpg so DB waits yield the event loop instead of
+# blocking a threadpool worker per request. Pool defaults (5 connections)
+# are far too small for concurrent FastAPI traffic, so size it explicitly.
+engine = create_async_engine(
+    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -19,15 +28,23 @@ async def init_db():
     """Initialize database tables"""
     # Import all models here to ensure they're registered
     from app.models import conversation, message, context_pack, user
-    
+
     # Create all tables
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        if settings.USE_PGVECTOR:
+            # The vector column type requires the pgvector extension
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(Base.metadata.create_all)
+        if settings.USE_PGVECTOR:
+            # HNSW index so similarity search is a sub-linear ANN graph
+            # traversal instead of a full-table distance scan
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_messages_embedding_hnsw "
+                "ON messages USING hnsw (embedding_vector vector_cosine_ops)"
+            ))
 
 
-def get_db():
+async def get_db():
     """Dependency to get database session"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -5,6 +5,7 @@ Main FastAPI application entry point
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
@@ -26,7 +27,10 @@ app = FastAPI(
     title="ContextLink API",
     description="Universal AI Memory Fabric for seamless LLM switching",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson serializes datetimes/Decimals natively and writes bytes
+    # directly, which matters for large conversation payloads
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
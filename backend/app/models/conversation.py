@@ -2,7 +2,7 @@
 Conversation model - represents a chat session
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Index, Numeric, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -10,9 +10,20 @@ from app.core.database import Base
 
 class Conversation(Base):
     """Conversation model representing a chat session"""
-    
+
     __tablename__ = "conversations"
-    
+    __table_args__ = (
+        # Partial index matching list_conversations (is_active filter +
+        # updated_at DESC ordering) so the listing is an ordered index scan
+        Index(
+            "idx_conversations_active_updated",
+            text("updated_at DESC"),
+            postgresql_where=text("is_active = true"),
+        ),
+        # Covers per-user listings once routes filter by user_id
+        Index("idx_conversations_active_user", "is_active", "user_id"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -25,11 +36,17 @@ class Conversation(Base):
     
     # Context management
     current_model = Column(String(100), default="gpt-4")
+    message_count = Column(Integer, default=0, nullable=False)  # maintained on message insert
     total_tokens = Column(Integer, default=0)
-    estimated_cost = Column(String(20), default="0.00")
-    estimated_carbon = Column(String(20), default="0.00")  # in grams CO2
+    estimated_cost = Column(Numeric(14, 8), default=0)
+    estimated_carbon = Column(Numeric(14, 8), default=0)  # in grams CO2
     
     # Relationships
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    messages = relationship(
+        "Message",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        order_by="Message.created_at",
+    )
     user = relationship("User", back_populates="conversations")
     context_pack = relationship("ContextPack", back_populates="conversations")
@@ -2,19 +2,36 @@
 Message model - represents individual messages in a conversation
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, JSON
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Index, JSON, Numeric
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from app.core.config import settings
 from app.core.database import Base
 
 
 class Message(Base):
     """Message model representing individual messages in a conversation"""
-    
+
     __tablename__ = "messages"
-    
+    # Fetch server defaults (created_at) via INSERT .. RETURNING in the same
+    # round-trip as the flush, so callers never need a follow-up refresh
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # Serves "WHERE conversation_id = ? ORDER BY created_at" with a single
+        # ordered index scan instead of a seq scan + sort. The INCLUDE columns
+        # (Postgres-only) let small-metadata queries run as index-only scans
+        # without heap fetches; content stays out as it's far too wide.
+        Index(
+            "idx_messages_conversation_created",
+            "conversation_id",
+            "created_at",
+            postgresql_include=["id", "role", "model_used", "token_count"],
+        ),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, index=True)
     
     # Message content
     role = Column(String(20), nullable=False)  # 'user', 'assistant', 'system'
@@ -24,13 +41,23 @@ class Message(Base):
     # Metadata
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     token_count = Column(Integer, default=0)
-    cost = Column(String(20), default="0.00")
-    carbon_footprint = Column(String(20), default="0.00")  # in grams CO2
+    cost = Column(Numeric(14, 8), default=0)
+    carbon_footprint = Column(Numeric(14, 8), default=0)  # in grams CO2
     
     # Context management
     is_context_compressed = Column(Boolean, default=False)
     compression_ratio = Column(String(10), default="1.0")  # e.g., "0.3" for 70% compression
-    embedding_vector = Column(JSON, nullable=True)  # Store embedding for semantic search
+    # pgvector embedding (all-MiniLM-L6-v2 is 384-dimensional); enables
+    # native cosine-distance search inside Postgres. Without the vector
+    # extension (USE_PGVECTOR=False) the column degrades to a plain JSON
+    # array and ranking happens in NumPy instead
+    embedding_vector = Column(
+        Vector(384) if settings.USE_PGVECTOR else JSON, nullable=True
+    )
+    # 64-bit SimHash of the embedding (sign bits of a fixed random
+    # projection); lets similarity search prefilter candidates with a cheap
+    # XOR + popcount before the exact cosine pass
+    embedding_sig = Column(BigInteger, nullable=True)
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
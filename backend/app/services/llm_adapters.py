@@ -2,11 +2,18 @@
 LLM Adapter System - Abstract interface for different LLM providers
 """
 
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
+import numpy as np
 from pydantic import BaseModel
 from enum import Enum
 
+import tiktoken
+
+# Shared BPE encoder for usage estimation across all adapters
+_ENC = tiktoken.get_encoding("cl100k_base")
+
 
 class MessageRole(str, Enum):
     """Message roles for LLM conversations"""
@@ -29,9 +36,24 @@ class LLMResponse(BaseModel):
     token_count: int
     cost: float
     carbon_footprint: float
+    # Usage as reported by the provider API (OpenAI usage.prompt_tokens,
+    # Anthropic usage.input_tokens, ...); callers fall back to local
+    # tokenization when absent
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
     metadata: Optional[Dict[str, Any]] = None
 
 
+def _total_tokens(messages: List["LLMMessage"]) -> int:
+    """Total token count across message contents
+
+    encode_batch runs in Rust and releases the GIL, so one call replaces a
+    Python .split() scan per message per estimator.
+    """
+    contents = [msg.content for msg in messages]
+    return sum(len(tokens) for tokens in _ENC.encode_batch(contents, disallowed_special=()))
+
+
 class LLMAdapter(ABC):
     """Abstract base class for LLM adapters"""
     
@@ -71,6 +93,12 @@ class OpenAIAdapter(LLMAdapter):
     def __init__(self, api_key: str, model_name: str = "gpt-4"):
         super().__init__(api_key, model_name)
         self.client = None  # Will be initialized when needed
+        self._model_info = {
+            "provider": "openai",
+            "model": self.model_name,
+            "max_tokens": 4096,
+            "supports_functions": True
+        }
     
     async def generate_response(
         self, 
@@ -84,24 +112,18 @@ class OpenAIAdapter(LLMAdapter):
     
     def get_model_info(self) -> Dict[str, Any]:
         """Get OpenAI model information"""
-        return {
-            "provider": "openai",
-            "model": self.model_name,
-            "max_tokens": 4096,
-            "supports_functions": True
-        }
+        return self._model_info
     
     def estimate_cost(self, messages: List[LLMMessage]) -> float:
         """Estimate OpenAI cost"""
-        # Basic cost estimation logic
-        total_tokens = sum(len(msg.content.split()) * 1.3 for msg in messages)  # Rough estimate
+        total_tokens = _total_tokens(messages)
         if "gpt-4" in self.model_name:
             return total_tokens * 0.00003  # $0.03 per 1K tokens
         return total_tokens * 0.000002  # $0.002 per 1K tokens for GPT-3.5
     
     def estimate_carbon_footprint(self, messages: List[LLMMessage]) -> float:
         """Estimate carbon footprint"""
-        total_tokens = sum(len(msg.content.split()) * 1.3 for msg in messages)
+        total_tokens = _total_tokens(messages)
         return total_tokens * 0.0000005  # Rough estimate: 0.5g CO2 per 1K tokens
 
 
@@ -111,6 +133,12 @@ class AnthropicAdapter(LLMAdapter):
     def __init__(self, api_key: str, model_name: str = "claude-3-sonnet-20240229"):
         super().__init__(api_key, model_name)
         self.client = None  # Will be initialized when needed
+        self._model_info = {
+            "provider": "anthropic",
+            "model": self.model_name,
+            "max_tokens": 4096,
+            "supports_functions": False
+        }
     
     async def generate_response(
         self, 
@@ -124,21 +152,16 @@ class AnthropicAdapter(LLMAdapter):
     
     def get_model_info(self) -> Dict[str, Any]:
         """Get Anthropic model information"""
-        return {
-            "provider": "anthropic",
-            "model": self.model_name,
-            "max_tokens": 4096,
-            "supports_functions": False
-        }
+        return self._model_info
     
     def estimate_cost(self, messages: List[LLMMessage]) -> float:
         """Estimate Anthropic cost"""
-        total_tokens = sum(len(msg.content.split()) * 1.3 for msg in messages)
+        total_tokens = _total_tokens(messages)
         return total_tokens * 0.000015  # $0.015 per 1K tokens for Claude
     
     def estimate_carbon_footprint(self, messages: List[LLMMessage]) -> float:
         """Estimate carbon footprint"""
-        total_tokens = sum(len(msg.content.split()) * 1.3 for msg in messages)
+        total_tokens = _total_tokens(messages)
         return total_tokens * 0.0000003  # Rough estimate: 0.3g CO2 per 1K tokens
 
 
@@ -148,6 +171,12 @@ class GoogleAdapter(LLMAdapter):
     def __init__(self, api_key: str, model_name: str = "gemini-pro"):
         super().__init__(api_key, model_name)
         self.client = None  # Will be initialized when needed
+        self._model_info = {
+            "provider": "google",
+            "model": self.model_name,
+            "max_tokens": 8192,
+            "supports_functions": True
+        }
     
     async def generate_response(
         self, 
@@ -161,47 +190,108 @@ class GoogleAdapter(LLMAdapter):
     
     def get_model_info(self) -> Dict[str, Any]:
         """Get Google model information"""
-        return {
-            "provider": "google",
-            "model": self.model_name,
-            "max_tokens": 8192,
-            "supports_functions": True
-        }
+        return self._model_info
     
     def estimate_cost(self, messages: List[LLMMessage]) -> float:
         """Estimate Google cost"""
-        total_tokens = sum(len(msg.content.split()) * 1.3 for msg in messages)
+        total_tokens = _total_tokens(messages)
         return total_tokens * 0.000001  # $0.001 per 1K tokens for Gemini
     
     def estimate_carbon_footprint(self, messages: List[LLMMessage]) -> float:
         """Estimate carbon footprint"""
-        total_tokens = sum(len(msg.content.split()) * 1.3 for msg in messages)
+        total_tokens = _total_tokens(messages)
         return total_tokens * 0.0000002  # Rough estimate: 0.2g CO2 per 1K tokens
 
 
+class SemanticResponseCache:
+    """In-process semantic cache for LLM responses
+
+    Prompts are embedded (by the injected encoder, e.g. the shared MiniLM
+    from the memory layer) and looked up by cosine similarity; a hit above
+    the threshold returns the cached LLMResponse instead of re-invoking the
+    provider, turning a multi-second network call into a sub-millisecond
+    dot product.
+    """
+
+    def __init__(
+        self,
+        encoder: Callable[[str], np.ndarray],
+        threshold: float = 0.95,
+        max_entries: int = 1024
+    ):
+        self._encoder = encoder
+        self._threshold = threshold
+        self._max_entries = max_entries
+        self._vectors: Optional[np.ndarray] = None  # (N, d), unit-norm rows
+        self._responses: List[LLMResponse] = []
+
+    @staticmethod
+    def _render(model_name: str, messages: List[LLMMessage]) -> str:
+        """Flatten model + conversation into a single cache-key text"""
+        lines = [model_name]
+        lines.extend(f"{msg.role.value}: {msg.content}" for msg in messages)
+        return "\n".join(lines)
+
+    def _encode(self, model_name: str, messages: List[LLMMessage]) -> np.ndarray:
+        vector = np.asarray(
+            self._encoder(self._render(model_name, messages)), dtype=np.float32
+        )
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self, model_name: str, messages: List[LLMMessage]) -> Optional[LLMResponse]:
+        """Return a cached response for a semantically equivalent prompt"""
+        if not self._responses:
+            return None
+        query = self._encode(model_name, messages)
+        scores = self._vectors @ query
+        best = int(np.argmax(scores))
+        if scores[best] >= self._threshold:
+            return self._responses[best]
+        return None
+
+    def put(self, model_name: str, messages: List[LLMMessage], response: LLMResponse):
+        """Cache a response keyed by its prompt embedding"""
+        vector = self._encode(model_name, messages)[np.newaxis, :]
+        if self._vectors is None:
+            self._vectors = vector
+        else:
+            if len(self._responses) >= self._max_entries:
+                # Drop the oldest entry to bound memory
+                self._vectors = self._vectors[1:]
+                self._responses.pop(0)
+            self._vectors = np.vstack([self._vectors, vector])
+        self._responses.append(response)
+
+
 class LLMRouter:
     """Router for managing multiple LLM adapters"""
     
-    def __init__(self):
+    def __init__(self, response_cache: Optional[SemanticResponseCache] = None):
         self.adapters: Dict[str, LLMAdapter] = {}
-    
+        self.response_cache = response_cache
+        self._models_cache: Optional[List[Dict[str, Any]]] = None
+
     def register_adapter(self, name: str, adapter: LLMAdapter):
         """Register an LLM adapter"""
         self.adapters[name] = adapter
-    
+        self._models_cache = None  # invalidate the cached listing
+
     def get_adapter(self, name: str) -> Optional[LLMAdapter]:
         """Get an LLM adapter by name"""
         return self.adapters.get(name)
-    
+
     def list_available_models(self) -> List[Dict[str, Any]]:
         """List all available models"""
-        return [
-            {
-                "name": name,
-                "info": adapter.get_model_info()
-            }
-            for name, adapter in self.adapters.items()
-        ]
+        if self._models_cache is None:
+            self._models_cache = [
+                {
+                    "name": name,
+                    "info": adapter.get_model_info()
+                }
+                for name, adapter in self.adapters.items()
+            ]
+        return self._models_cache
     
     async def generate_response(
         self, 
@@ -213,5 +303,47 @@ class LLMRouter:
         adapter = self.get_adapter(model_name)
         if not adapter:
             raise ValueError(f"Model {model_name} not found")
-        
-        return await adapter.generate_response(messages, **kwargs)
+
+        # Only near-deterministic requests are cacheable; higher temperatures
+        # are expected to produce varied output
+        cacheable = (
+            self.response_cache is not None
+            and kwargs.get("temperature", 0.7) <= 0.3
+        )
+        if cacheable:
+            cached = self.response_cache.get(model_name, messages)
+            if cached is not None:
+                return cached
+
+        response = await adapter.generate_response(messages, **kwargs)
+
+        if cacheable and response is not None:
+            self.response_cache.put(model_name, messages, response)
+
+        return response
+
+    async def generate_responses_parallel(
+        self,
+        model_names: List[str],
+        messages: List[LLMMessage],
+        max_concurrency: int = 50,
+        **kwargs
+    ) -> List[Any]:
+        """Generate responses from several models concurrently
+
+        Provider calls are dominated by network wait, so fanning out with
+        asyncio.gather overlaps them; a semaphore bounds the in-flight
+        requests. Failed calls come back as exception objects in their slot
+        (return_exceptions=True) so one slow or broken provider doesn't void
+        the others - useful for A/B routing, ensembling and fallbacks.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _one(name: str):
+            async with semaphore:
+                return await self.generate_response(name, messages, **kwargs)
+
+        return await asyncio.gather(
+            *(_one(name) for name in model_names),
+            return_exceptions=True
+        )
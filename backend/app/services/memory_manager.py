@@ -2,21 +2,116 @@
 Memory Manager - Handles conversation state and context reconstruction
 """
 
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import diskcache
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.models.conversation import Conversation
 from app.models.message import Message
 from app.services.llm_adapters import LLMMessage, MessageRole
 from sentence_transformers import SentenceTransformer
-import json
+
+_EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Lazily-loaded module-level model so every MemoryManager (one per request)
+# shares a single copy of the ~90 MB weights instead of reloading them
+_embedder: Optional[SentenceTransformer] = None
+_embedder_lock = threading.Lock()
+
+
+def _get_embedder() -> SentenceTransformer:
+    """Load the shared embedding model on first use
+
+    With EMBEDDING_BACKEND="onnx" the model runs through ONNX Runtime
+    (fused LayerNorm/GELU/MatMul kernels) instead of PyTorch eager, which
+    is typically 2-3x faster for CPU inference; "torch" keeps the default
+    PyTorch path for environments without onnxruntime installed.
+    """
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                kwargs = {}
+                if settings.EMBEDDING_BACKEND != "torch":
+                    kwargs["backend"] = settings.EMBEDDING_BACKEND
+                _embedder = SentenceTransformer(_EMBEDDING_MODEL_NAME, **kwargs)
+    return _embedder
+
+
+# Persistent cache so repeated texts (system prompts, duplicate queries)
+# skip the 10-30 ms CPU encode; keys include the model name to avoid
+# cross-model collisions. Values are quantized to int8 with a per-vector
+# scale (4x smaller than float32; MiniLM embeddings lose <1% recall)
+_embedding_cache = diskcache.Cache(settings.EMBEDDING_CACHE_DIR)
+
+
+def _quantize(vector: np.ndarray) -> bytes:
+    """Pack a float32 vector as a float32 scale followed by int8 values"""
+    scale = float(np.abs(vector).max()) / 127.0 or 1.0
+    quantized = np.clip(np.rint(vector / scale), -128, 127).astype(np.int8)
+    return np.float32(scale).tobytes() + quantized.tobytes()
+
+
+def _dequantize(blob: bytes) -> np.ndarray:
+    """Inverse of _quantize"""
+    scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+    quantized = np.frombuffer(blob, dtype=np.int8, offset=4)
+    return quantized.astype(np.float32) * scale
+
+
+# Fixed random projection for 64-bit SimHash signatures. The seed is pinned
+# so signatures stay comparable across processes and restarts.
+_SIG_PROJ = np.ascontiguousarray(
+    np.random.default_rng(384).standard_normal((384, 64)), dtype=np.float32
+)
+
+# Only engage the signature prefilter above this many candidates, and keep
+# this many for the exact re-rank
+_PREFILTER_MIN = 1024
+_PREFILTER_CANDIDATES = 200
+
+
+def _signature(vector: np.ndarray) -> int:
+    """64-bit SimHash of an embedding: sign bits of a random projection
+
+    Vectors within a small angle of each other agree on most sign bits, so
+    Hamming distance between signatures approximates cosine distance.
+    Returned as a signed int to fit a BIGINT column.
+    """
+    bits = np.packbits(vector @ _SIG_PROJ > 0)
+    return int(bits.view(np.int64)[0])
+
+
+# Role strings from the DB map onto enum members via a plain dict lookup;
+# MessageRole(value) walks the enum's _missing_/value-lookup machinery on
+# every message, which adds up over long contexts
+_ROLE = {role.value: role for role in MessageRole}
+
+
+def _embed(text: str) -> np.ndarray:
+    """Encode text, short-circuiting through the on-disk cache"""
+    key = hashlib.sha256(f"{_EMBEDDING_MODEL_NAME}|{text}".encode()).digest()
+    cached = _embedding_cache.get(key)
+    if cached is not None:
+        return _dequantize(cached)
+
+    # Unit-norm vectors make cosine similarity a plain dot product downstream
+    vector = _get_embedder().encode(text, normalize_embeddings=True).astype(np.float32)
+    _embedding_cache[key] = _quantize(vector)
+    return vector
 
 
 class MemoryManager:
     """Manages conversation memory and context reconstruction"""
-    
-    def __init__(self, db: Session):
+
+    def __init__(self, db: AsyncSession):
         self.db = db
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embedding_model = _get_embedder()
     
     async def store_message(
         self, 
@@ -26,12 +121,21 @@ class MemoryManager:
         model_used: str,
         token_count: int = 0,
         cost: float = 0.0,
-        carbon_footprint: float = 0.0
+        carbon_footprint: float = 0.0,
+        commit: bool = False,
+        embedding: Optional[List[float]] = None
     ) -> Message:
-        """Store a new message in the conversation"""
-        
+        """Store a new message in the conversation
+
+        By default the message is only flushed so callers can batch several
+        writes into a single transaction; pass commit=True to commit here.
+        An embedding computed ahead of time (see embed_text) can be passed
+        in to skip the synchronous encode.
+        """
+
         # Generate embedding for semantic search
-        embedding = self.embedding_model.encode(content).tolist()
+        if embedding is None:
+            embedding = _embed(content).tolist()
         
         message = Message(
             conversation_id=conversation_id,
@@ -39,17 +143,93 @@ class MemoryManager:
             content=content,
             model_used=model_used,
             token_count=token_count,
-            cost=str(cost),
-            carbon_footprint=str(carbon_footprint),
-            embedding_vector=embedding
+            cost=cost,
+            carbon_footprint=carbon_footprint,
+            embedding_vector=embedding,
+            embedding_sig=_signature(np.asarray(embedding, dtype=np.float32))
         )
-        
+
         self.db.add(message)
-        self.db.commit()
-        self.db.refresh(message)
-        
+
+        # Keep the denormalized counter in sync within the same transaction
+        await self.db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(message_count=Conversation.message_count + 1)
+        )
+
+        if commit:
+            await self.db.commit()
+        else:
+            # Flush assigns the primary key without ending the transaction;
+            # eager_defaults on Message means created_at comes back in the
+            # same INSERT .. RETURNING, so no refresh is needed either way
+            await self.db.flush()
+
         return message
     
+    def embed_text(self, content: str) -> List[float]:
+        """Encode content through the cache; safe to run in a worker thread
+        (e.g. asyncio.to_thread) to overlap with I/O waits"""
+        return _embed(content).tolist()
+
+    async def store_messages(
+        self,
+        conversation_id: int,
+        items: List[Dict[str, Any]],
+        commit: bool = False
+    ) -> List[Message]:
+        """Store several messages at once
+
+        Embeddings are encoded in a single batched forward pass, which
+        amortizes tokenizer and dispatch overhead into one large matmul
+        instead of one tiny one per message, and all rows go into one
+        transaction.
+        """
+
+        if not items:
+            return []
+
+        texts = [item["content"] for item in items]
+        vectors = self.embedding_model.encode(
+            texts,
+            batch_size=32,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+
+        messages = [
+            Message(
+                conversation_id=conversation_id,
+                role=item["role"],
+                content=item["content"],
+                model_used=item.get("model_used"),
+                token_count=item.get("token_count", 0),
+                cost=item.get("cost", 0.0),
+                carbon_footprint=item.get("carbon_footprint", 0.0),
+                embedding_vector=vector.tolist(),
+                embedding_sig=_signature(np.asarray(vector, dtype=np.float32))
+            )
+            for item, vector in zip(items, vectors)
+        ]
+
+        self.db.add_all(messages)
+
+        # Keep the denormalized counter in sync within the same transaction
+        await self.db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(message_count=Conversation.message_count + len(messages))
+        )
+
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
+
+        return messages
+
     async def get_conversation_context(
         self, 
         conversation_id: int, 
@@ -58,19 +238,29 @@ class MemoryManager:
     ) -> List[LLMMessage]:
         """Get conversation context for LLM input"""
         
-        # Get recent messages
+        # Get recent messages, projecting only the columns the context needs;
+        # this skips ORM hydration and above all avoids decoding each row's
+        # 384-float embedding vector
         messages = (
-            self.db.query(Message)
-            .filter(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.desc())
-            .limit(max_messages)
-            .all()
-        )
+            await self.db.execute(
+                select(
+                    Message.id,
+                    Message.role,
+                    Message.content,
+                    Message.model_used,
+                    Message.created_at,
+                    Message.is_context_compressed,
+                )
+                .where(Message.conversation_id == conversation_id)
+                .order_by(Message.created_at.desc())
+                .limit(max_messages)
+            )
+        ).all()
         
         # Convert to LLMMessage format
         context = []
         for msg in reversed(messages):  # Reverse to get chronological order
-            role = MessageRole(msg.role)
+            role = _ROLE[msg.role]
             content = msg.content
             
             # If message is compressed, we might want to expand it
@@ -78,7 +268,10 @@ class MemoryManager:
                 # TODO: Implement context expansion
                 pass
             
-            context.append(LLMMessage(
+            # model_construct skips validation - these values come straight
+            # from our own typed columns, so re-validating every turn's
+            # context is pure overhead
+            context.append(LLMMessage.model_construct(
                 role=role,
                 content=content,
                 metadata={
@@ -100,30 +293,52 @@ class MemoryManager:
         
         # Get all messages in the conversation
         messages = (
-            self.db.query(Message)
-            .filter(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.asc())
-            .all()
-        )
-        
+            await self.db.scalars(
+                select(Message)
+                .where(Message.conversation_id == conversation_id)
+                .order_by(Message.created_at.asc())
+            )
+        ).all()
+
         if len(messages) <= 5:  # Don't compress if conversation is short
             return messages
         
         # Simple compression strategy: keep first and last few messages
         keep_count = max(2, int(len(messages) * target_ratio))
-        
+
         # Mark messages for compression
         messages_to_compress = messages[2:-2]  # Keep first 2 and last 2
-        
-        for msg in messages_to_compress:
-            if not msg.is_context_compressed:
-                # Create a summary of the message
-                summary = await self._summarize_message(msg)
-                msg.content = f"[COMPRESSED] {summary}"
-                msg.is_context_compressed = True
-                msg.compression_ratio = str(target_ratio)
-        
-        self.db.commit()
+
+        # Summarize first, then write all rows in one executemany UPDATE by
+        # primary key - one round-trip instead of one UPDATE per message
+        compressed = [
+            (msg, await self._summarize_message(msg))
+            for msg in messages_to_compress
+            if not msg.is_context_compressed
+        ]
+
+        if compressed:
+            await self.db.execute(
+                update(Message),
+                [
+                    {
+                        "id": msg.id,
+                        "content": f"[COMPRESSED] {summary}",
+                        "is_context_compressed": True,
+                        "compression_ratio": str(target_ratio),
+                    }
+                    for msg, summary in compressed
+                ],
+            )
+
+        await self.db.commit()
+
+        # Reflect the new state on the already-loaded objects for the caller
+        for msg, summary in compressed:
+            msg.content = f"[COMPRESSED] {summary}"
+            msg.is_context_compressed = True
+            msg.compression_ratio = str(target_ratio)
+
         return messages
     
     async def _summarize_message(self, message: Message) -> str:
@@ -135,77 +350,155 @@ class MemoryManager:
         return content
     
     async def search_similar_messages(
-        self, 
-        query: str, 
+        self,
+        query: str,
         conversation_id: Optional[int] = None,
         limit: int = 5
-    ) -> List[Message]:
-        """Search for similar messages using semantic similarity"""
-        
+    ) -> List[Tuple[Message, float]]:
+        """Search for similar messages using semantic similarity
+
+        Returns (message, similarity) pairs ordered by decreasing similarity.
+        """
+
         # Generate query embedding
-        query_embedding = self.embedding_model.encode(query).tolist()
-        
-        # Get all messages (or from specific conversation)
-        query_obj = self.db.query(Message)
+        query_embedding = _embed(query).tolist()
+
+        if settings.USE_PGVECTOR:
+            return await self._search_pgvector(query_embedding, conversation_id, limit)
+        return await self._search_python(query_embedding, conversation_id, limit)
+
+    async def _search_pgvector(
+        self,
+        query_embedding: List[float],
+        conversation_id: Optional[int],
+        limit: int
+    ) -> List[Tuple[Message, float]]:
+        """Rank messages by cosine distance inside Postgres (pgvector)"""
+
+        distance = Message.embedding_vector.cosine_distance(query_embedding)
+        stmt = select(Message, distance.label("distance")).where(
+            Message.embedding_vector.is_not(None)
+        )
         if conversation_id:
-            query_obj = query_obj.filter(Message.conversation_id == conversation_id)
-        
-        messages = query_obj.all()
-        
-        # Calculate similarities
-        similarities = []
-        for msg in messages:
-            if msg.embedding_vector:
-                # Calculate cosine similarity
-                similarity = self._cosine_similarity(query_embedding, msg.embedding_vector)
-                similarities.append((msg, similarity))
-        
-        # Sort by similarity and return top results
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return [msg for msg, _ in similarities[:limit]]
-    
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        import numpy as np
-        
-        vec1 = np.array(vec1)
-        vec2 = np.array(vec2)
-        
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0
-        
-        return dot_product / (norm1 * norm2)
-    
+            stmt = stmt.where(Message.conversation_id == conversation_id)
+        stmt = stmt.order_by(distance).limit(limit)
+
+        rows = (await self.db.execute(stmt)).all()
+        return [(msg, 1.0 - dist) for msg, dist in rows]
+
+    async def _search_python(
+        self,
+        query_embedding: List[float],
+        conversation_id: Optional[int],
+        limit: int
+    ) -> List[Tuple[Message, float]]:
+        """Fallback: scan embeddings in NumPy when pgvector is unavailable
+
+        All candidate vectors are stacked into one (N, d) float32 matrix and
+        scored with a single matrix-vector product, replacing N per-message
+        Python round-trips with one BLAS call. Above _PREFILTER_MIN rows the
+        stored SimHash signatures prefilter the field first: one XOR +
+        popcount per row versus a 384-float dot product, and only the
+        surviving candidates' full vectors ever leave the database.
+        """
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+
+        conditions = [Message.embedding_vector.is_not(None)]
+        if conversation_id:
+            conditions.append(Message.conversation_id == conversation_id)
+
+        # Decide whether the prefilter is worth engaging with one cheap
+        # aggregate instead of pulling every (id, sig) pair only to find N
+        # is small. count(embedding_sig) skips NULLs, so matching the total
+        # also proves no legacy rows predate the signature column
+        total, with_sig = (
+            await self.db.execute(
+                select(func.count(), func.count(Message.embedding_sig))
+                .select_from(Message)
+                .where(*conditions)
+            )
+        ).one()
+        if not total:
+            return []
+
+        stmt = select(Message).where(*conditions)
+
+        if total > _PREFILTER_MIN and with_sig == total:
+            sig_rows = (
+                await self.db.execute(
+                    select(Message.id, Message.embedding_sig).where(*conditions)
+                )
+            ).all()
+            sigs = np.array([sig for _, sig in sig_rows], dtype=np.int64)
+            xor = sigs ^ np.int64(_signature(query))
+            hamming = np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+            n_cand = min(_PREFILTER_CANDIDATES, len(sig_rows))
+            keep = np.argpartition(hamming, n_cand - 1)[:n_cand]
+            stmt = stmt.where(Message.id.in_([sig_rows[i][0] for i in keep]))
+
+        messages = (await self.db.scalars(stmt)).all()
+        if not messages:
+            return []
+
+        # C-contiguous float32 so the matmul below dispatches to BLAS sgemv.
+        # Vectors are stored unit-norm (normalize_embeddings=True at encode
+        # time), so cosine similarity is just the dot product - no per-row
+        # norms needed
+        matrix = np.ascontiguousarray(
+            [msg.embedding_vector for msg in messages], dtype=np.float32
+        )
+        query = np.asarray(query_embedding, dtype=np.float32)
+
+        scores = matrix @ query
+
+        # Partial top-k selection, then order just those k by score
+        k = min(limit, len(messages))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(messages[i], float(scores[i])) for i in top]
+
     async def get_conversation_summary(self, conversation_id: int) -> Dict[str, Any]:
         """Get a summary of the conversation"""
         
-        conversation = self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        if not conversation:
+        # One round-trip: the conversation row and its aggregates come back
+        # together via an outer join instead of two sequential queries
+        row = (
+            await self.db.execute(
+                select(
+                    Conversation,
+                    func.count(Message.id),
+                    func.coalesce(func.sum(Message.token_count), 0),
+                    func.coalesce(func.sum(Message.cost), 0),
+                    func.coalesce(func.sum(Message.carbon_footprint), 0),
+                    func.array_agg(func.distinct(Message.model_used)),
+                )
+                .join(Message, Message.conversation_id == Conversation.id, isouter=True)
+                .where(Conversation.id == conversation_id)
+                .group_by(Conversation.id)
+            )
+        ).one_or_none()
+        if row is None:
             return {}
-        
-        messages = (
-            self.db.query(Message)
-            .filter(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.asc())
-            .all()
-        )
-        
-        total_tokens = sum(msg.token_count for msg in messages)
-        total_cost = sum(float(msg.cost) for msg in messages)
-        total_carbon = sum(float(msg.carbon_footprint) for msg in messages)
-        
+
+        (
+            conversation,
+            message_count,
+            total_tokens,
+            total_cost,
+            total_carbon,
+            models_used,
+        ) = row
+
         return {
             "conversation_id": conversation_id,
             "title": conversation.title,
-            "message_count": len(messages),
+            "message_count": message_count,
             "total_tokens": total_tokens,
             "total_cost": f"{total_cost:.4f}",
             "total_carbon": f"{total_carbon:.4f}",
-            "models_used": list(set(msg.model_used for msg in messages if msg.model_used)),
+            "models_used": [m for m in (models_used or []) if m],
             "created_at": conversation.created_at.isoformat(),
             "last_updated": conversation.updated_at.isoformat() if conversation.updated_at else None
         }